@@ -0,0 +1,208 @@
+import pandas as pd
+import polars as pl
+import streamlit as st
+import numpy as np
+import numba
+import re
+from datetime import datetime
+from io import BytesIO
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+customer_col = 'Customer'
+product_col = 'Product'
+deficit_col = 'Dificit Qty.'
+
+# Below this many rows the pandas groupby beats paying for the JIT dispatch
+numba_min_rows = 100_000
+
+
+@st.cache_data(show_spinner=False)
+def load_and_prepare(file_bytes: bytes) -> tuple[pd.DataFrame, pd.DataFrame, pd.DatetimeIndex, pd.MultiIndex, np.ndarray, np.ndarray]:
+    # Read Excel
+    df = pl.read_excel(BytesIO(file_bytes), sheet_id=1, engine='calamine', read_options={'header_row': 2})
+    df = df.filter(pl.col(customer_col).is_not_null() | pl.col(product_col).is_not_null())
+
+    # Identify columns
+    production_cols = [col for col in df.columns if 'Production' in col]
+    sales_cols = [col for col in df.columns if 'Sales' in col]
+
+    # Type every column once: keys as strings, quantities as float32 (unparseable -> null)
+    numeric_cols = production_cols + sales_cols + ([deficit_col] if deficit_col in df.columns else [])
+    df = df.with_columns(
+        pl.col(customer_col, product_col).cast(pl.String),
+        pl.col(numeric_cols).cast(pl.Float32, strict=False),
+    )
+
+    # Extract month-year from the column names and convert to datetime
+    month_map = {'Oct': 10, 'Nov': 11, 'Dec': 12, 'Jan': 1, 'Feb': 2}
+    col_to_date = {}
+    for col in production_cols + sales_cols:
+        month_match = re.search(r"(Oct|Nov|Dec|Jan|Feb)", col)
+        year_match = re.search(r"(\\d{2})", col)
+        if month_match is None:
+            continue
+        month_num = month_map[month_match.group(1)]
+        year = (int(year_match.group(1)) if year_match else 25) + 2000
+        if month_num in (1, 2):
+            year += 1
+        col_to_date[col] = datetime(year, month_num, 1)
+    measure_map = {col: 'Production' if col in production_cols else 'Sales' for col in col_to_date}
+
+    # Reshape production and sales into one long frame keyed by date; the row
+    # number keeps repeated (Customer, Product) rows apart through the pivot
+    long = (
+        df.with_row_index('__row')
+        .unpivot(on=list(col_to_date), index=['__row', customer_col, product_col],
+                 variable_name='Month', value_name='Value')
+        .with_columns(
+            pl.col('Month').replace_strict(measure_map).alias('Measure'),
+            pl.col('Month').replace_strict(col_to_date, return_dtype=pl.Datetime).alias('Date'),
+        )
+        .pivot(on='Measure', index=['__row', customer_col, product_col, 'Date'], values='Value',
+               aggregate_function='first')
+        .drop('__row')
+    )
+
+    # Add deficit
+    if deficit_col in df.columns:
+        deficit_data = df.select(customer_col, product_col, deficit_col).drop_nulls()
+        long = long.join(deficit_data, on=[customer_col, product_col], how='left', maintain_order='left')
+
+    merged = long.to_pandas()
+    merged[customer_col] = merged[customer_col].astype('category')
+    merged[product_col] = merged[product_col].astype('category')
+
+    # Index by date so month slices are index lookups
+    merged = merged.sort_values('Date', kind='stable').set_index('Date')
+
+    # Widget-independent aggregates
+    monthly_summary = monthly_aggregates(merged)
+    date_index = merged.index.unique()
+
+    # Date x (Customer, Product) float32 arrays for KPIs and month-over-month
+    # comparisons; C order keeps each month's values in one contiguous row
+    wide = (
+        merged.groupby([customer_col, product_col, 'Date'], observed=True, dropna=False)[['Production', 'Sales']]
+        .sum(min_count=1)
+        .unstack('Date')
+    )
+    row_index = wide.index
+    prod_arr = np.ascontiguousarray(wide['Production'].reindex(columns=date_index).to_numpy(np.float32).T)
+    sales_arr = np.ascontiguousarray(wide['Sales'].reindex(columns=date_index).to_numpy(np.float32).T)
+
+    return merged, monthly_summary, date_index, row_index, prod_arr, sales_arr
+
+
+def monthly_aggregates(merged: pd.DataFrame) -> pd.DataFrame:
+    # Accumulate the float32 columns in float64 so large monthly totals keep their precision
+    return merged[['Production', 'Sales']].astype(np.float64).groupby(level='Date').sum().reset_index()
+
+
+def neighbour_dates(date_index: pd.DatetimeIndex, selected_date):
+    pos = int(date_index.searchsorted(selected_date))
+    prev_date = date_index[pos - 1] if pos > 0 else None
+    next_date = date_index[pos + 1] if pos + 1 < len(date_index) else None
+    return pos, prev_date, next_date
+
+
+def filter_frame(merged: pd.DataFrame, selected_date, selected_customer, selected_product) -> pd.DataFrame:
+    filtered = merged.loc[[selected_date]]
+    if selected_customer:
+        filtered = filtered[filtered[customer_col].isin(selected_customer)]
+    if selected_product:
+        filtered = filtered[filtered[product_col].isin(selected_product)]
+    return filtered
+
+
+@numba.njit(cache=True)
+def _group_sum2(codes, a, b, n_groups):
+    out_a = np.zeros(n_groups)
+    out_b = np.zeros(n_groups)
+    counts = np.zeros(n_groups, dtype=np.int64)
+    for i in range(len(codes)):
+        c = codes[i]
+        if c < 0:
+            continue
+        counts[c] += 1
+        if not np.isnan(a[i]):
+            out_a[c] += a[i]
+        if not np.isnan(b[i]):
+            out_b[c] += b[i]
+    return out_a, out_b, counts
+
+
+def customer_totals(filtered: pd.DataFrame) -> pd.DataFrame:
+    if len(filtered) < numba_min_rows:
+        return filtered.groupby(customer_col, observed=True)[['Production', 'Sales']].sum().reset_index()
+    customers = filtered[customer_col].cat
+    production, sales, counts = _group_sum2(
+        customers.codes.to_numpy(), filtered['Production'].to_numpy(), filtered['Sales'].to_numpy(),
+        len(customers.categories),
+    )
+    # Match the pandas branch: categorical customers, sums in the input dtype
+    observed = np.flatnonzero(counts)
+    return pd.DataFrame({
+        customer_col: pd.Categorical.from_codes(observed, dtype=filtered[customer_col].dtype),
+        'Production': production[observed].astype(filtered['Production'].dtype),
+        'Sales': sales[observed].astype(filtered['Sales'].dtype),
+    })
+
+
+def _linear_forecast(y: np.ndarray) -> float:
+    # A line needs two points; with fewer, carry the last value forward
+    if len(y) < 2:
+        return float(y[-1]) if len(y) else np.nan
+    month_index = np.arange(len(y))
+    slope, intercept = np.polyfit(month_index, y.astype(np.float64), 1)
+    return slope * len(y) + intercept
+
+
+@st.cache_data(show_spinner=False)
+def forecast_next(monthly_summary: pd.DataFrame) -> tuple[float, float]:
+    forecast_data = monthly_summary.dropna()
+    return (_linear_forecast(forecast_data['Production'].to_numpy()),
+            _linear_forecast(forecast_data['Sales'].to_numpy()))
+
+
+def row_mask(row_index: pd.MultiIndex, selected_customer, selected_product) -> np.ndarray:
+    mask = np.ones(len(row_index), dtype=bool)
+    if selected_customer:
+        mask &= row_index.get_level_values(customer_col).isin(selected_customer)
+    if selected_product:
+        mask &= row_index.get_level_values(product_col).isin(selected_product)
+    return mask
+
+
+def compare_months(row_index: pd.MultiIndex, prod_arr: np.ndarray, sales_arr: np.ndarray,
+                   mask: np.ndarray, from_pos: int, to_pos: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'Production_Diff': prod_arr[to_pos, mask] - prod_arr[from_pos, mask],
+        'Sales_Diff': sales_arr[to_pos, mask] - sales_arr[from_pos, mask],
+    }, index=row_index[mask]).reset_index()
+
+
+@st.cache_data(show_spinner=False)
+def detect_anomalies(monthly_summary: pd.DataFrame) -> pd.DataFrame:
+    production = monthly_summary['Production'].to_numpy()
+    sales = monthly_summary['Sales'].to_numpy()
+    prod_outlier = np.abs(production - np.nanmean(production)) > 2 * np.nanstd(production, ddof=1)
+    sales_outlier = np.abs(sales - np.nanmean(sales)) > 2 * np.nanstd(sales, ddof=1)
+    return monthly_summary[prod_outlier | sales_outlier]
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def filtered_csv(_filtered: pd.DataFrame, file_id: str, selected_date,
+                 selected_customer: tuple, selected_product: tuple) -> bytes:
+    table = pa.Table.from_pandas(_filtered.reset_index(), preserve_index=False)
+    # Categorical columns arrive as dictionary arrays; write their plain values,
+    # and write Date without a time of day
+    table = table.cast(pa.schema([
+        field.with_type(pa.date32()) if field.name == 'Date'
+        else field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type)
+        else field
+        for field in table.schema
+    ]))
+    buf = BytesIO()
+    pacsv.write_csv(table, buf)
+    return buf.getvalue()